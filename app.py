@@ -5,21 +5,27 @@ Translates PPTX and DOCX files using DeepL API
 
 import os
 import sys
+import queue
+import asyncio
 import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
+from typing import NamedTuple, Optional
 
 # Add bundled modules path for PyInstaller
 if getattr(sys, 'frozen', False):
     os.chdir(os.path.dirname(sys.executable))
 
-from translator import Translator
-from pptx_processor import PPTXProcessor
-from docx_processor import DOCXProcessor
+# Translator and the document processors (python-pptx / python-docx) are
+# imported on first use so the window comes up without loading them.
 
-# DeepL API key (free tier)
-DEEPL_API_KEY = 'e87352a7-9518-4019-bb38-73f09eb2581b:fx'
+# Keyring entry used when DEEPL_API_KEY is not set in the environment
+KEYRING_SERVICE = 'DocumentTranslator'
+KEYRING_USERNAME = 'deepl_api_key'
+
+# Status label refresh interval; worker messages in between are coalesced
+STATUS_POLL_MS = 100
 
 LANGUAGES = {
     'Slovenian': 'sl',
@@ -33,6 +39,27 @@ LANGUAGES = {
 }
 
 
+def load_deepl_api_key() -> Optional[str]:
+    """DeepL API key from the environment, falling back to the OS keyring."""
+    key = os.environ.get('DEEPL_API_KEY')
+    if key:
+        return key
+    try:
+        import keyring
+        return keyring.get_password(KEYRING_SERVICE, KEYRING_USERNAME)
+    except Exception:
+        return None
+
+
+class PathInfo(NamedTuple):
+    """Selected file details, derived once when the file is picked."""
+    path: Path
+    stem: str
+    suffix: str
+    parent: Path
+    size: int
+
+
 class TranslatorApp:
     def __init__(self, root):
         self.root = root
@@ -46,7 +73,14 @@ class TranslatorApp:
         self.style.configure('Status.TLabel', font=('Segoe UI', 10))
         
         self.selected_file = None
+        self._path_info = None
+        self._status_q = queue.Queue(maxsize=1)  # Latest status message only
         self.setup_ui()
+        self.root.after(STATUS_POLL_MS, self._poll_status)
+        
+        # Translation runs as coroutines on one background event loop
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
         
     def setup_ui(self):
         # Main frame with padding
@@ -104,10 +138,12 @@ class TranslatorApp:
         filename = filedialog.askopenfilename(filetypes=filetypes)
         if filename:
             self.selected_file = filename
+            path = Path(filename)
+            self._path_info = PathInfo(path, path.stem, path.suffix.lower(), path.parent,
+                                       os.path.getsize(filename))
             # Show just filename, not full path
-            display_name = Path(filename).name
-            size_mb = os.path.getsize(filename) / 1024 / 1024
-            self.file_label.config(text=f"{display_name} ({size_mb:.1f} MB)")
+            size_mb = self._path_info.size / 1024 / 1024
+            self.file_label.config(text=f"{path.name} ({size_mb:.1f} MB)")
             
     def start_translation(self):
         if not self.selected_file:
@@ -123,36 +159,42 @@ class TranslatorApp:
         self.progress.start(10)
         self.status_label.config(text="Translating... This may take a few minutes for large files.")
         
-        # Run translation in background thread
-        thread = threading.Thread(target=self.do_translation)
-        thread.daemon = True
-        thread.start()
+        # Run translation on the background event loop
+        asyncio.run_coroutine_threadsafe(self._async_do_translation(self.lang_var.get()), self.loop)
         
-    def do_translation(self):
+    async def _async_do_translation(self, lang_name):
         try:
-            input_path = Path(self.selected_file)
-            lang_code = LANGUAGES[self.lang_var.get()]
+            info = self._path_info
+            input_path = info.path
+            lang_code = LANGUAGES[lang_name]
             
             # Generate output filename
-            output_path = input_path.parent / f"{input_path.stem}_{self.lang_var.get()}{input_path.suffix}"
+            output_path = info.parent / f"{info.stem}_{lang_name}{info.suffix}"
             
             # Initialize translator
             self.update_status("Initializing translator...")
-            translator = Translator(target_lang=lang_code, deepl_api_key=DEEPL_API_KEY)
+            from translator import Translator
+            # Construction probes googletrans over the network; keep it off the loop
+            translator = await asyncio.to_thread(
+                Translator, target_lang=lang_code, deepl_api_key=load_deepl_api_key()
+            )
             
             # Process based on file type
-            ext = input_path.suffix.lower()
+            ext = info.suffix
             
-            if ext == '.pptx':
-                self.update_status("Processing PowerPoint...")
-                processor = PPTXProcessor(translator, status_callback=self.update_status)
-                processor.process_file(str(input_path), str(output_path))
-            elif ext == '.docx':
-                self.update_status("Processing Word document...")
-                processor = DOCXProcessor(translator, status_callback=self.update_status)
-                processor.process_file(str(input_path), str(output_path))
-            else:
-                raise ValueError(f"Unsupported file type: {ext}")
+            async with translator:
+                if ext == '.pptx':
+                    self.update_status("Processing PowerPoint...")
+                    from pptx_processor import PPTXProcessor
+                    processor = PPTXProcessor(translator, status_callback=self.update_status)
+                    await processor.process_file_async(str(input_path), str(output_path))
+                elif ext == '.docx':
+                    self.update_status("Processing Word document...")
+                    from docx_processor import DOCXProcessor
+                    processor = DOCXProcessor(translator, status_callback=self.update_status)
+                    await processor.process_file_async(str(input_path), str(output_path))
+                else:
+                    raise ValueError(f"Unsupported file type: {ext}")
             
             # Success
             self.translation_complete(True, str(output_path))
@@ -161,10 +203,31 @@ class TranslatorApp:
             self.translation_complete(False, str(e))
             
     def update_status(self, message):
-        self.root.after(0, lambda: self.status_label.config(text=message))
+        # Called from the event loop thread; replace any message not yet shown
+        try:
+            self._status_q.put_nowait(message)
+        except queue.Full:
+            self._drain_status()
+            try:
+                self._status_q.put_nowait(message)
+            except queue.Full:
+                pass
+    
+    def _drain_status(self):
+        try:
+            return self._status_q.get_nowait()
+        except queue.Empty:
+            return None
+    
+    def _poll_status(self):
+        message = self._drain_status()
+        if message is not None:
+            self.status_label.config(text=message)
+        self.root.after(STATUS_POLL_MS, self._poll_status)
         
     def translation_complete(self, success, result):
         def update_ui():
+            self._drain_status()  # Don't let a stale progress message overwrite the result
             self.progress.stop()
             self.translate_btn.config(state='normal')
             
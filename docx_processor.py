@@ -4,14 +4,45 @@ DOCX Processor - OPTIMIZED
 Fast processing with batch translation.
 """
 
+import os
+import re
 import logging
-from typing import List, Tuple
+import shutil
+import zipfile
+from typing import Dict, List, NamedTuple, Set, Tuple
 from docx import Document
-from docx.table import Table
+from docx.oxml.ns import nsmap, qn
+from lxml import etree
+
+from text_utils import needs_translation, split_translated
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Precompiled XPath: walk run content directly instead of Paragraph/Run wrappers.
+# Tabs and line breaks are included (as python-docx's run.text does) so words
+# either side of them aren't glued together; page/column breaks carry no text.
+_W_NS = {'w': nsmap['w']}
+_TEXT_XPATH = etree.XPath(
+    './/w:r/w:t | .//w:r/w:tab | .//w:r/w:cr'
+    ' | .//w:r/w:br[not(@w:type) or @w:type="textWrapping"]',
+    namespaces=_W_NS
+)
+_PARA_XPATH = etree.XPath('ancestor::w:p[1]', namespaces=_W_NS)
+_TABLE_COUNT_XPATH = etree.XPath('count(.//w:tbl)', namespaces=_W_NS)
+_XML_SPACE = qn('xml:space')
+_W_T = qn('w:t')
+_SEPARATOR_RE = re.compile(r'(\t|\n)')
+
+
+class TextLocation(NamedTuple):
+    """A paragraph collected for translation, with the part it belongs to."""
+    para: object
+    runs: list
+    orig_combined: str
+    orig_texts: list
+    part: object
+
 
 class DOCXProcessor:
     def __init__(self, translator, status_callback=None):
@@ -33,107 +64,177 @@ class DOCXProcessor:
     
     def process_file(self, input_path: str, output_path: str) -> dict:
         try:
-            self._update_status("Loading document...")
-            doc = Document(input_path)
-            
-            # Collect all text locations
-            text_locations: List[Tuple] = []
-            
-            # Main body
-            self._update_status("Collecting text from document...")
-            for para in doc.paragraphs:
-                self._collect_paragraph(para, text_locations)
-                self.stats['paragraphs_processed'] += 1
-            
-            # Tables
-            for table in doc.tables:
-                self._collect_table(table, text_locations)
-                self.stats['tables_processed'] += 1
-            
-            # Headers and footers
-            for section in doc.sections:
-                try:
-                    if section.header:
-                        for para in section.header.paragraphs:
-                            self._collect_paragraph(para, text_locations)
-                        self.stats['headers_processed'] += 1
-                    if section.footer:
-                        for para in section.footer.paragraphs:
-                            self._collect_paragraph(para, text_locations)
-                        self.stats['footers_processed'] += 1
-                except:
-                    pass
-            
-            if text_locations:
-                self._update_status(f"Batch translating {len(text_locations)} text blocks...")
-                
-                # Batch translate
-                all_texts = [loc[2] for loc in text_locations]
-                translated = self.translator.translate_batch(all_texts)
-                
-                # Apply translations
-                for (para, runs, orig_combined, orig_texts), trans in zip(text_locations, translated):
-                    if trans and trans != orig_combined:
-                        self._redistribute_text_to_runs(runs, orig_texts, trans)
-                        self.stats['text_runs_translated'] += len(runs)
+            doc, text_locations, unique_texts = self._collect_document(input_path)
+            translated = self.translator.translate_batch(unique_texts) if unique_texts else []
+            return self._finish(doc, input_path, output_path, text_locations, unique_texts, translated)
             
-            self._update_status("Saving translated document...")
-            doc.save(output_path)
-            
-            self.stats['translator_stats'] = self.translator.get_stats()
-            return self.stats
+        except Exception as e:
+            logger.error(f"Error processing file: {e}")
+            self.stats['errors'].append(str(e))
+            raise
+    
+    async def process_file_async(self, input_path: str, output_path: str) -> dict:
+        """process_file for callers running inside an asyncio event loop."""
+        try:
+            doc, text_locations, unique_texts = self._collect_document(input_path)
+            translated = await self.translator.translate_batch_async(unique_texts) if unique_texts else []
+            return self._finish(doc, input_path, output_path, text_locations, unique_texts, translated)
             
         except Exception as e:
             logger.error(f"Error processing file: {e}")
             self.stats['errors'].append(str(e))
             raise
     
-    def _collect_paragraph(self, para, text_locations: List) -> None:
-        """Collect text from a paragraph."""
-        runs = list(para.runs)
-        if not runs:
-            return
+    def _collect_document(self, input_path: str) -> Tuple:
+        """Load the document and collect its text locations and distinct texts."""
+        self._update_status("Loading document...")
+        doc = Document(input_path)
         
-        orig_texts = [r.text for r in runs]
-        combined = ''.join(orig_texts)
+        # Collect all text locations
+        text_locations: List[TextLocation] = []
+        
+        # Main body (paragraphs and tables, including nested ones)
+        self._update_status("Collecting text from document...")
+        body = doc.element.body
+        self.stats['paragraphs_processed'] += self._collect_element(body, doc.part, text_locations)
+        self.stats['tables_processed'] += int(_TABLE_COUNT_XPATH(body))
+        
+        # Headers and footers - parts shared between sections are collected once
+        seen_parts = set()
+        for section in doc.sections:
+            try:
+                for hdr_ftr, stat in ((section.header, 'headers_processed'),
+                                      (section.footer, 'footers_processed')):
+                    # Linked sections reuse an earlier section's part
+                    if hdr_ftr.is_linked_to_previous:
+                        continue
+                    part = hdr_ftr.part
+                    if part in seen_parts:
+                        continue
+                    seen_parts.add(part)
+                    self._collect_element(part.element, part, text_locations)
+                    self.stats[stat] += 1
+            except:
+                pass
         
-        if combined.strip() and len(combined.strip()) >= 2:
-            text_locations.append((para, runs, combined, orig_texts))
+        # Translate each distinct text once, then fan out to every location
+        unique_texts = list(dict.fromkeys(loc.orig_combined for loc in text_locations))
+        if unique_texts:
+            self._update_status(
+                f"Batch translating {len(unique_texts)} unique text blocks "
+                f"({len(text_locations)} total)..."
+            )
+        return doc, text_locations, unique_texts
     
-    def _collect_table(self, table: Table, text_locations: List) -> None:
-        """Collect text from table cells."""
+    def _finish(self, doc, input_path: str, output_path: str, text_locations: List[TextLocation],
+                unique_texts: List[str], translated: List[str]) -> dict:
+        """Apply translations and save the document."""
+        text_to_trans = dict(zip(unique_texts, translated))
+        
+        # Apply translations
+        modified_parts: Set = set()
+        runs_translated = 0
+        for loc in text_locations:
+            trans = text_to_trans.get(loc.orig_combined)
+            if trans and trans != loc.orig_combined:
+                self._redistribute_text_to_runs(loc.runs, loc.orig_texts, trans)
+                runs_translated += len(loc.runs)
+                modified_parts.add(loc.part)
+        self.stats['text_runs_translated'] += runs_translated
+        
+        self._update_status("Saving translated document...")
+        self._save(doc, input_path, output_path, modified_parts)
+        
+        self.stats['translator_stats'] = self.translator.get_stats()
+        return self.stats
+    
+    def _save(self, doc, input_path: str, output_path: str, modified_parts: Set) -> None:
+        """
+        Write the output by copying the input zip entry by entry, re-serialising
+        only the XML parts that were changed. Media and untouched parts are
+        never reprocessed by python-docx. Falls back to doc.save() if the
+        parts can't be matched to zip entries.
+        """
+        members = {part.partname.membername: part for part in modified_parts}
         try:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        self._collect_paragraph(para, text_locations)
-        except Exception as e:
-            self.stats['errors'].append(f"Table error: {e}")
+            if os.path.abspath(input_path) == os.path.abspath(output_path):
+                raise ValueError("output would overwrite input")
+            with zipfile.ZipFile(input_path) as src:
+                infos = src.infolist()
+                if not set(members) <= {zi.filename for zi in infos}:
+                    raise KeyError("modified part missing from input archive")
+                with zipfile.ZipFile(output_path, 'w') as dst:
+                    for zi in infos:
+                        part = members.get(zi.filename)
+                        if part is not None:
+                            dst.writestr(zi, part.blob)
+                        else:
+                            with src.open(zi) as fin, dst.open(zi, 'w') as fout:
+                                shutil.copyfileobj(fin, fout)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning(f"Streaming save unavailable ({e}), saving full document")
+            doc.save(output_path)
+    
+    def _collect_element(self, root, part, text_locations: List) -> int:
+        """Collect text from all paragraphs under an XML element; returns paragraph count."""
+        # Group text elements by their nearest w:p, in document order
+        paragraphs: Dict = {}
+        for t in _TEXT_XPATH(root):
+            para = _PARA_XPATH(t)
+            if para:
+                paragraphs.setdefault(para[0], []).append(t)
+        
+        for para, runs in paragraphs.items():
+            self._collect_paragraph(para, runs, part, text_locations)
+        return len(paragraphs)
+    
+    def _collect_paragraph(self, para, runs: List, part, text_locations: List) -> None:
+        """Collect text from a paragraph's w:t, w:tab and w:br/w:cr elements."""
+        # str() gives each element's text: w:t content, '\t' or '\n'
+        orig_texts = [str(el) for el in runs]
+        combined = ''.join(orig_texts)
+        
+        if needs_translation(combined):
+            text_locations.append(TextLocation(para, runs, combined, orig_texts, part))
     
     def _redistribute_text_to_runs(self, runs, original_texts, translated_text) -> None:
-        """Redistribute translated text proportionally."""
-        total_len = sum(len(t) for t in original_texts)
+        """
+        Put translated text back into the paragraph. Tabs and line breaks stay
+        in place as fixed separators: the translation is split on them and each
+        segment is shared out proportionally over the w:t elements between.
+        If the translation's separators don't match, each w:r gets its share
+        through python-docx's run text setter, which rebuilds tabs and breaks.
+        """
+        # w:t indices between consecutive separators, and the separators
+        groups: List[List[int]] = [[]]
+        separators = []
+        for i, el in enumerate(runs):
+            if el.tag == _W_T:
+                groups[-1].append(i)
+            else:
+                separators.append(original_texts[i])
+                groups.append([])
         
-        if total_len == 0:
-            if runs:
-                runs[0].text = translated_text
+        parts = _SEPARATOR_RE.split(translated_text.replace('\r\n', '\n'))
+        segments = parts[0::2]
+        if parts[1::2] != separators or any(seg.strip() for idxs, seg in zip(groups, segments) if not idxs):
+            self._redistribute_by_run(runs, translated_text)
             return
         
-        trans_len = len(translated_text)
-        pos = 0
-        
-        for i, (run, orig) in enumerate(zip(runs, original_texts)):
-            if i == len(runs) - 1:
-                run.text = translated_text[pos:]
-            else:
-                prop = len(orig) / total_len
-                chars = int(trans_len * prop)
-                end = pos + chars
-                
-                if end < trans_len:
-                    space = translated_text.rfind(' ', pos, end + 10)
-                    if space > pos:
-                        end = space + 1
-                
-                run.text = translated_text[pos:end]
-                pos = end
+        for idxs, segment in zip(groups, segments):
+            if not idxs:
+                continue
+            pieces = split_translated([original_texts[i] for i in idxs], segment)
+            for i, piece in zip(idxs, pieces):
+                t = runs[i]
+                t.text = piece
+                # Word drops leading/trailing spaces unless told to preserve them
+                if piece != piece.strip():
+                    t.set(_XML_SPACE, 'preserve')
+    
+    @staticmethod
+    def _redistribute_by_run(elements, translated_text) -> None:
+        """Fallback: split the translation over whole w:r elements by their text."""
+        runs = list(dict.fromkeys(el.getparent() for el in elements))
+        for r, piece in zip(runs, split_translated([r.text for r in runs], translated_text)):
+            r.text = piece
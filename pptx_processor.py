@@ -1,175 +1,398 @@
 """
 PPTX Processor - OPTIMIZED
 --------------------------
-Fast processing with batch translation per slide.
+Fast processing with one batch translation for the whole presentation.
+Slide and notes XML is read straight from the .pptx zip and only changed
+parts are written back; python-pptx's full object model is never loaded.
 """
 
+import os
+import re
+import shutil
+import asyncio
 import logging
-from typing import List, Tuple
-from pptx import Presentation
-from pptx.shapes.group import GroupShape
-from pptx.shapes.base import BaseShape
-from pptx.table import Table
-from pptx.text.text import TextFrame
+import zipfile
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import namespaces, qn
+from lxml import etree
+
+from text_utils import needs_translation, split_translated
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Slide and notes parts, e.g. ppt/slides/slide3.xml, ppt/notesSlides/notesSlide3.xml
+_PART_RE = re.compile(r'ppt/(slides|notesSlides)/(?:slide|notesSlide)(\d+)\.xml')
+
+# Precompiled XPath over the part XML (shapes, groups and table cells alike)
+_NS = namespaces('a', 'p')
+_SLIDE_PARA_XPATH = etree.XPath('p:cSld/p:spTree//a:p', namespaces=_NS)
+# Notes: only the body placeholder (not slide image, number or header/footer)
+_NOTES_PARA_XPATH = etree.XPath(
+    'p:cSld/p:spTree/p:sp[p:nvSpPr/p:nvPr/p:ph/@type="body"]/p:txBody/a:p', namespaces=_NS
+)
+_RUN_XPATH = etree.XPath('a:r', namespaces=_NS)
+_SHAPE_COUNT_XPATH = etree.XPath(
+    'count(p:cSld/p:spTree//*[self::p:sp or self::p:pic or self::p:graphicFrame or self::p:cxnSp])',
+    namespaces=_NS
+)
+_TABLE_COUNT_XPATH = etree.XPath('count(p:cSld/p:spTree//a:tbl)', namespaces=_NS)
+_GROUP_COUNT_XPATH = etree.XPath('count(p:cSld/p:spTree//p:grpSp)', namespaces=_NS)
+
+_A_T = qn('a:t')
+
+# rPr attributes that record editor state (spell-check, edits), not formatting
+_RPR_VOLATILE = frozenset({'dirty', 'err', 'smtClean'})
+
+# Async pipeline: distinct texts per translation batch, batches buffered
+# ahead of the translators, and concurrent translate_batch_async calls
+# (each one already runs several requests at once)
+PIPELINE_BATCH_TEXTS = 400
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_CONSUMERS = 2
+
+
+@dataclass
+class Stats:
+    """Processing counters; plain attributes are cheaper to bump than dict items."""
+    slides_processed: int = 0
+    shapes_processed: int = 0
+    text_runs_translated: int = 0
+    tables_processed: int = 0
+    notes_translated: int = 0
+    groups_traversed: int = 0
+    errors: List[str] = field(default_factory=list)
+    translator_stats: dict = field(default_factory=dict)
+    
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class TextLocation(NamedTuple):
+    """A paragraph collected for translation, with the slide or notes part it belongs to."""
+    para: object
+    runs: list
+    orig_combined: str
+    orig_texts: list
+    part: str
+
+
+class SlidePart(NamedTuple):
+    """A slide or notes part of the package."""
+    name: str
+    slide_no: int
+    is_notes: bool
+
+
+def _format_key(r) -> tuple:
+    """Comparable form of a run's formatting (its a:rPr, minus editor state)."""
+    rPr = r.rPr
+    if rPr is None:
+        return ()
+    attrs = tuple(sorted((k, v) for k, v in rPr.attrib.items() if k not in _RPR_VOLATILE))
+    return attrs, b''.join(etree.tostring(child) for child in rPr)
+
+
+def _coalesce_runs(runs: list) -> list:
+    """
+    Merge a:r elements into the preceding one when they are siblings with
+    the same formatting, removing the merged elements. Returns the runs left.
+    """
+    merged = [runs[0]]
+    prev_key = _format_key(runs[0])
+    for r in runs[1:]:
+        key = _format_key(r)
+        last = merged[-1]
+        if key == prev_key and last.getnext() is r:
+            last.text = last.text + r.text
+            r.getparent().remove(r)
+        else:
+            merged.append(r)
+            prev_key = key
+    return merged
+
 
 class PPTXProcessor:
     def __init__(self, translator, status_callback=None):
         self.translator = translator
         self.status_callback = status_callback
-        self.stats = {
-            'slides_processed': 0,
-            'shapes_processed': 0,
-            'text_runs_translated': 0,
-            'tables_processed': 0,
-            'notes_translated': 0,
-            'groups_traversed': 0,
-            'errors': []
-        }
+        self.stats = Stats()
     
     def _update_status(self, message):
         if self.status_callback:
             self.status_callback(message)
         logger.info(message)
     
+    def _load(self, zf: zipfile.ZipFile) -> List[SlidePart]:
+        """List the slide and notes parts, each slide followed by its notes."""
+        self._update_status("Loading presentation...")
+        parts = []
+        for name in zf.namelist():
+            m = _PART_RE.fullmatch(name)
+            if m:
+                parts.append(SlidePart(name, int(m.group(2)), m.group(1) == 'notesSlides'))
+        parts.sort(key=lambda p: (p.slide_no, p.is_notes))
+        num_slides = sum(not p.is_notes for p in parts)
+        self._update_status(f"Loaded {num_slides} slides - using fast batch mode")
+        return parts
+    
+    def _save(self, input_path: str, output_path: str, modified: Dict) -> dict:
+        """
+        Write the output by copying the input zip entry by entry, re-serialising
+        only the slide and notes parts whose text changed; everything else
+        (media, layouts, untouched slides) is streamed across byte for byte.
+        """
+        self._update_status("Saving translated presentation...")
+        tmp_path = output_path + '.tmp'
+        try:
+            with zipfile.ZipFile(input_path) as src, zipfile.ZipFile(tmp_path, 'w') as dst:
+                for zi in src.infolist():
+                    root = modified.get(zi.filename)
+                    if root is not None:
+                        dst.writestr(zi, etree.tostring(root, encoding='UTF-8', standalone=True))
+                    else:
+                        with src.open(zi) as fin, dst.open(zi, 'w') as fout:
+                            shutil.copyfileobj(fin, fout)
+            # Replace only once complete (this also allows output_path == input_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        self.stats.translator_stats = self.translator.get_stats()
+        return self.stats.to_dict()
+    
     def process_file(self, input_path: str, output_path: str) -> dict:
+        """
+        Two passes over the whole presentation: collect every paragraph,
+        then translate all distinct texts in one batch (the translator
+        splits it into API-sized requests) and write the results back.
+        A deck already in the target language is copied unchanged.
+        """
         try:
-            self._update_status("Loading presentation...")
-            prs = Presentation(input_path)
-            num_slides = len(prs.slides)
-            self._update_status(f"Loaded {num_slides} slides - using fast batch mode")
+            with zipfile.ZipFile(input_path) as zf:
+                roots, text_locations = self.collect_paragraphs(zf, self._load(zf))
             
-            for slide_idx, slide in enumerate(prs.slides):
+            unique_texts = list(dict.fromkeys(loc.orig_combined for loc in text_locations))
+            modified_parts: Set[str] = set()
+            if unique_texts and not self._already_in_target_lang(unique_texts):
+                translated_texts = self._translate_all(unique_texts)
+                modified_parts = self._apply_translations(text_locations, unique_texts, translated_texts)
+            
+            return self._save(input_path, output_path, {name: roots[name] for name in modified_parts})
+        
+        except Exception as e:
+            logger.error(f"Error processing file: {e}")
+            self.stats.errors.append(str(e))
+            raise
+    
+    async def process_file_async(self, input_path: str, output_path: str) -> dict:
+        """
+        process_file for callers running inside an asyncio event loop.
+        Pipelined: a producer parses slides in a worker thread and queues
+        batches of new distinct texts, which consumers translate while
+        later slides are still being parsed. Translations are written back
+        once parsing is done, so the XML is never touched from two threads.
+        While the texts seen so far are dominantly in the target language,
+        batches are held back; if that still holds once parsing ends, the
+        deck is copied unchanged without any batch having been sent.
+        """
+        try:
+            roots: Dict[str, object] = {}
+            text_locations: List[TextLocation] = []
+            translations: Dict[str, str] = {}
+            queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+            
+            async def produce(zf, parts):
+                seen: Dict[str, None] = {}  # Distinct texts, in order
+                pending: List[str] = []
+                held: Optional[List[List[str]]] = []  # None once the deck needs translating
+                num_slides = sum(not p.is_notes for p in parts)
                 try:
-                    self._update_status(f"Slide {slide_idx + 1}/{num_slides}...")
-                    self._process_slide_batch(slide)
-                    self.stats['slides_processed'] += 1
-                except Exception as e:
-                    error_msg = f"Error on slide {slide_idx + 1}: {e}"
-                    logger.error(error_msg)
-                    self.stats['errors'].append(error_msg)
+                    for part in parts:
+                        root, locations = await asyncio.to_thread(self._collect_part_safe, zf, part, num_slides)
+                        roots[part.name] = root
+                        text_locations.extend(locations)
+                        for loc in locations:
+                            if loc.orig_combined not in seen:
+                                seen[loc.orig_combined] = None
+                                pending.append(loc.orig_combined)
+                        if len(pending) >= PIPELINE_BATCH_TEXTS:
+                            if held is not None and self._dominant_is_target(list(seen)):
+                                held.append(pending)
+                            else:
+                                for batch in held or []:
+                                    await queue.put(batch)
+                                held = None
+                                await queue.put(pending)
+                            pending = []
+                    
+                    if held is None:
+                        if pending:
+                            await queue.put(pending)
+                        return
+                    # Nothing sent yet: decide on the whole deck
+                    if pending:
+                        held.append(pending)
+                    if held and not self._already_in_target_lang(list(seen)):
+                        for batch in held:
+                            await queue.put(batch)
+                finally:
+                    for _ in range(PIPELINE_CONSUMERS):
+                        await queue.put(None)
             
-            self._update_status("Saving translated presentation...")
-            prs.save(output_path)
+            async def consume():
+                while (batch := await queue.get()) is not None:
+                    translations.update(zip(batch, await self._translate_all_async(batch)))
             
-            self.stats['translator_stats'] = self.translator.get_stats()
-            return self.stats
+            with zipfile.ZipFile(input_path) as zf:
+                parts = await asyncio.to_thread(self._load, zf)
+                await asyncio.gather(produce(zf, parts), *(consume() for _ in range(PIPELINE_CONSUMERS)))
             
+            modified_parts: Set[str] = set()
+            if translations:
+                modified_parts = self._apply_translations(text_locations, list(translations),
+                                                          list(translations.values()))
+            
+            return await asyncio.to_thread(self._save, input_path, output_path,
+                                           {name: roots[name] for name in modified_parts})
+        
         except Exception as e:
             logger.error(f"Error processing file: {e}")
-            self.stats['errors'].append(str(e))
+            self.stats.errors.append(str(e))
             raise
     
-    def _process_slide_batch(self, slide) -> None:
+    def collect_paragraphs(self, zf: zipfile.ZipFile, parts: List[SlidePart]) -> Tuple[Dict, List[TextLocation]]:
         """
-        OPTIMIZED: Collect all texts from slide, batch translate, then apply.
-        Much faster than translating one text at a time.
+        Parse every slide and notes part and collect its text locations.
+        Returns the parsed roots by part name, and the locations.
         """
-        # Collect all text locations
-        text_locations: List[Tuple] = []  # (paragraph, runs, original_texts, combined_text)
+        roots: Dict[str, object] = {}
+        text_locations: List[TextLocation] = []
+        num_slides = sum(not p.is_notes for p in parts)
         
-        # Gather from all shapes
-        for shape in slide.shapes:
-            self._collect_texts(shape, text_locations)
+        for part in parts:
+            roots[part.name], locations = self._collect_part_safe(zf, part, num_slides)
+            text_locations.extend(locations)
         
-        # Gather from notes
+        return roots, text_locations
+    
+    def _collect_part_safe(self, zf: zipfile.ZipFile, part: SlidePart, num_slides: int) -> Tuple:
+        """Parse a part and run _collect_part, with progress; a failing part is logged and skipped."""
         try:
-            if slide.has_notes_slide and slide.notes_slide.notes_text_frame:
-                for para in slide.notes_slide.notes_text_frame.paragraphs:
-                    runs = list(para.runs)
-                    if runs:
-                        orig = [r.text for r in runs]
-                        combined = ''.join(orig)
-                        if combined.strip():
-                            text_locations.append((para, runs, orig, combined))
-        except:
-            pass
-        
-        if not text_locations:
-            return
-        
-        # Batch translate all texts at once
-        all_texts = [loc[3] for loc in text_locations]
-        translated_texts = self.translator.translate_batch(all_texts)
-        
-        # Apply translations back
-        for (para, runs, orig_texts, orig_combined), translated in zip(text_locations, translated_texts):
-            if translated and translated != orig_combined:
-                self._redistribute_text_to_runs(runs, orig_texts, translated)
-                self.stats['text_runs_translated'] += len(runs)
-    
-    def _collect_texts(self, shape: BaseShape, text_locations: List) -> None:
-        """Recursively collect all translatable text from a shape."""
+            if not part.is_notes:
+                self._update_status(f"Slide {part.slide_no}/{num_slides}...")
+            root = parse_xml(zf.read(part.name))
+            text_locations = self._collect_part(root, part)
+            if not part.is_notes:
+                self.stats.slides_processed += 1
+            return root, text_locations
+        except Exception as e:
+            error_msg = f"Error in {part.name}: {e}"
+            logger.error(error_msg)
+            self.stats.errors.append(error_msg)
+            return None, []
+    
+    def _translate_all(self, unique_texts: List[str]) -> List[str]:
+        """Batch translate; falls back to one text at a time if the batch fails."""
+        self._update_status(f"Batch translating {len(unique_texts)} unique text blocks...")
         try:
-            if isinstance(shape, GroupShape):
-                self.stats['groups_traversed'] += 1
-                for child in shape.shapes:
-                    self._collect_texts(child, text_locations)
-                return
-            
-            if shape.has_table:
-                self._collect_table_texts(shape.table, text_locations)
-                self.stats['tables_processed'] += 1
-                return
-            
-            if shape.has_text_frame:
-                for para in shape.text_frame.paragraphs:
-                    runs = list(para.runs)
-                    if runs:
-                        orig = [r.text for r in runs]
-                        combined = ''.join(orig)
-                        if combined.strip() and len(combined.strip()) >= 2:
-                            text_locations.append((para, runs, orig, combined))
-            
-            self.stats['shapes_processed'] += 1
-            
+            return self.translator.translate_batch(unique_texts)
         except Exception as e:
-            self.stats['errors'].append(f"Shape error: {e}")
+            self._record_batch_failure(e)
+            return [self._translate_one(text) for text in unique_texts]
     
-    def _collect_table_texts(self, table: Table, text_locations: List) -> None:
-        """Collect all text from table cells."""
+    async def _translate_all_async(self, unique_texts: List[str]) -> List[str]:
+        self._update_status(f"Batch translating {len(unique_texts)} unique text blocks...")
         try:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text_frame:
-                        for para in cell.text_frame.paragraphs:
-                            runs = list(para.runs)
-                            if runs:
-                                orig = [r.text for r in runs]
-                                combined = ''.join(orig)
-                                if combined.strip() and len(combined.strip()) >= 2:
-                                    text_locations.append((para, runs, orig, combined))
+            return await self.translator.translate_batch_async(unique_texts)
         except Exception as e:
-            self.stats['errors'].append(f"Table error: {e}")
+            self._record_batch_failure(e)
+            return await asyncio.to_thread(lambda: [self._translate_one(text) for text in unique_texts])
     
-    def _redistribute_text_to_runs(self, runs, original_texts, translated_text) -> None:
-        """Redistribute translated text back to runs proportionally."""
-        total_len = sum(len(t) for t in original_texts)
+    def _dominant_is_target(self, texts: List[str]) -> bool:
+        """True if the texts are dominantly in the target language."""
+        return self.translator.detect_dominant(texts) == self.translator.target_lang
+    
+    def _already_in_target_lang(self, texts: List[str]) -> bool:
+        """True if the texts are dominantly in the target language (re-run on a translated deck)."""
+        if not self._dominant_is_target(texts):
+            return False
+        self._update_status(f"Presentation is already in '{self.translator.target_lang}' - skipping translation")
+        return True
+    
+    def _record_batch_failure(self, error: Exception) -> None:
+        error_msg = f"Batch translation failed, translating paragraph by paragraph: {error}"
+        logger.error(error_msg)
+        self.stats.errors.append(error_msg)
+    
+    def _translate_one(self, text: str) -> str:
+        """Error-recovery path: a single paragraph, keeping the original on failure."""
+        try:
+            return self.translator.translate(text)
+        except Exception as e:
+            self.stats.errors.append(f"Translation error: {e}")
+            return text
+    
+    def _collect_part(self, root, part: SlidePart) -> List[TextLocation]:
+        """Collect all text locations from a slide (shapes, groups, tables) or its notes."""
+        text_locations: List[TextLocation] = []
         
-        if total_len == 0:
-            if runs:
-                runs[0].text = translated_text
-            return
+        if part.is_notes:
+            for para in _NOTES_PARA_XPATH(root):
+                self._collect_paragraph(para, part.name, text_locations, min_len=1)
+            return text_locations
         
-        trans_len = len(translated_text)
-        pos = 0
+        for para in _SLIDE_PARA_XPATH(root):
+            self._collect_paragraph(para, part.name, text_locations)
+        self.stats.shapes_processed += int(_SHAPE_COUNT_XPATH(root))
+        self.stats.tables_processed += int(_TABLE_COUNT_XPATH(root))
+        self.stats.groups_traversed += int(_GROUP_COUNT_XPATH(root))
+        return text_locations
+    
+    def _apply_translations(self, text_locations: List[TextLocation], unique_texts: List[str],
+                            translated_texts: List[str]) -> Set[str]:
+        """
+        Write translations back to every location of each source text.
+        Returns the names of the parts that changed; a text whose translation
+        is the source itself (e.g. a re-run on a translated deck) changes nothing.
+        """
+        text_to_trans = dict(zip(unique_texts, translated_texts))
         
-        for i, (run, orig) in enumerate(zip(runs, original_texts)):
-            if i == len(runs) - 1:
-                run.text = translated_text[pos:]
-            else:
-                prop = len(orig) / total_len
-                chars = int(trans_len * prop)
-                end = pos + chars
-                
-                # Break at word boundary if possible
-                if end < trans_len:
-                    space = translated_text.rfind(' ', pos, end + 10)
-                    if space > pos:
-                        end = space + 1
-                
-                run.text = translated_text[pos:end]
-                pos = end
+        modified_parts: Set[str] = set()
+        runs_translated = 0
+        for loc in text_locations:
+            translated = text_to_trans.get(loc.orig_combined)
+            if translated and translated != loc.orig_combined:
+                self._redistribute_text_to_runs(loc.runs, loc.orig_texts, translated)
+                runs_translated += len(loc.runs)
+                modified_parts.add(loc.part)
+        self.stats.text_runs_translated += runs_translated
+        return modified_parts
+    
+    def _collect_paragraph(self, para, part: str, text_locations: List, min_len: int = 2) -> None:
+        """Collect a paragraph's runs (a:r elements) if its text needs translating."""
+        runs = _RUN_XPATH(para)
+        if not runs:
+            return
+        combined = ''.join(r.text for r in runs)
+        if needs_translation(combined, min_len):
+            # Fewer, longer runs leave fewer boundaries to place in the translation
+            if len(runs) > 1:
+                runs = _coalesce_runs(runs)
+            text_locations.append(TextLocation(para, runs, combined, [r.text for r in runs], part))
+    
+    def _redistribute_text_to_runs(self, runs, original_texts, translated_text) -> None:
+        """Redistribute translated text back to runs proportionally."""
+        for r, piece in zip(runs, split_translated(original_texts, translated_text)):
+            # Set the a:t element directly; the a:r text setter is only needed
+            # to escape characters XML can't hold (lxml raises ValueError)
+            t = r.find(_A_T)
+            if t is None:
+                t = etree.SubElement(r, _A_T)
+            try:
+                t.text = piece
+            except ValueError:
+                r.text = piece
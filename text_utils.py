@@ -0,0 +1,107 @@
+"""
+Text Utilities
+--------------
+Helpers shared by the PPTX and DOCX processors.
+"""
+
+import re
+from bisect import bisect_left
+from itertools import accumulate
+from typing import List
+
+_SPACE_RE = re.compile(' ')
+
+# East Asian wide/fullwidth characters (CJK, kana, hangul, fullwidth forms);
+# they carry roughly two Latin characters' worth of text each
+_WIDE_RE = re.compile(
+    '[\u1100-\u115f\u2e80-\ua4cf\uac00-\ud7a3\uf900-\ufaff\ufe30-\ufe4f'
+    '\uff00-\uff60\uffe0-\uffe6\U00020000-\U0003fffd]'
+)
+
+# Nothing to translate: no letters at all (numbers, dates, symbols), or a
+# bare URL, email address, identifier or currency amount (surrounding
+# whitespace allowed, so callers needn't strip first)
+_CURRENCY_CODES = 'EUR|USD|GBP|CHF|JPY|CNY|RSD|BAM'
+_SKIP_RE = re.compile(r'''
+    [\s\d\W_]+
+  | \s*(?:
+        (?:https?://|www\.)\S+                        # URL
+      | \S+@\S+                                       # email address
+      | [A-Z]{2,}-\d+                                 # identifier, e.g. SKU-1234
+      | (?:%(cur)s)\s?[\d.,]*\d[\d.,]*                # EUR 1.200,00
+      | [\d.,]*\d[\d.,]*\s?(?:%(cur)s)                # 1,200.00 USD
+    )\s*
+''' % {'cur': _CURRENCY_CODES}, re.VERBOSE)
+
+# Deletes every character str.strip() would remove (U+3000 is the highest)
+_WS_TABLE = str.maketrans('', '', ''.join(c for c in map(chr, range(0x3001)) if c.isspace()))
+
+
+def is_untranslatable(text: str) -> bool:
+    """True for text that needs no translation (numbers, URLs, emails)."""
+    return _SKIP_RE.fullmatch(text) is not None
+
+
+def needs_translation(combined: str, min_len: int = 2) -> bool:
+    """
+    True if text has at least min_len (1 or 2) non-blank characters and is
+    not untranslatable. Never builds a stripped copy of the text.
+    """
+    if len(combined) < min_len:
+        return False
+    # For min_len <= 2, "stripped length >= min_len" equals "non-blank chars >= min_len"
+    if (combined[0].isspace() or combined[-1].isspace()) and len(combined.translate(_WS_TABLE)) < min_len:
+        return False
+    return not is_untranslatable(combined)
+
+
+def text_weight(text: str) -> int:
+    """Visual weight of text: its length, with wide characters counted twice."""
+    if text.isascii():
+        return len(text)
+    return len(text) + _WIDE_RE.subn('', text)[1]
+
+
+def _split_boundaries(weights: List[int], trans_len: int) -> List[int]:
+    """
+    Unsnapped end offsets of every piece but the last, proportional to the
+    cumulative weights. Pure integer arithmetic; weights must not sum to 0.
+    """
+    total_weight = sum(weights)
+    return [cum_weight * trans_len // total_weight for cum_weight in accumulate(weights[:-1])]
+
+
+def split_translated(original_texts: List[str], translated_text: str) -> List[str]:
+    """
+    Split translated text into one piece per original run, proportional to
+    the original runs' visual weight and snapped to word boundaries where
+    possible.
+    """
+    # Single-run paragraphs (the common case) have no boundaries to place
+    if len(original_texts) == 1:
+        return [translated_text]
+    
+    weights = list(map(text_weight, original_texts))
+    if not any(weights):
+        return [translated_text] + [''] * (len(original_texts) - 1)
+    
+    trans_len = len(translated_text)
+    # Space positions are found once; each boundary is then a bisect
+    spaces = [m.start() for m in _SPACE_RE.finditer(translated_text)]
+    
+    pieces = []
+    pos = 0
+    for boundary in _split_boundaries(weights, trans_len):
+        end = max(pos, boundary)
+        
+        # Break after the last space before end + 10, if past pos
+        if end < trans_len:
+            k = bisect_left(spaces, end + 10) - 1
+            if k >= 0 and spaces[k] > pos:
+                end = spaces[k] + 1
+        
+        pieces.append(translated_text[pos:end])
+        pos = end
+    
+    pieces.append(translated_text[pos:])
+    return pieces
@@ -5,10 +5,21 @@ Fast translation with batch processing and googletrans primary.
 Target: <5 minutes for 20MB/115 slides
 """
 
+import os
+import re
 import time
+import asyncio
+import hashlib
+import heapq
+import json
 import logging
-from typing import Optional, List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Optional, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from text_utils import needs_translation
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,24 +35,177 @@ LANGUAGE_CODES = {
     'spanish': 'es',
 }
 
+# Persistent cache shared across runs (keyed by source hash + target language)
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.translator_cache.db')
+
+# In-memory LRU bound, so long-running processes don't grow without limit
+CACHE_MAX_ENTRIES = 50_000
+
+GTRANS_WORKERS = 32           # googletrans threads, kept for the Translator's lifetime
+
+DEEPL_URL = 'https://api-free.deepl.com/v2/translate'
+DEEPL_MAX_ITEMS = 50          # texts per request
+DEEPL_MAX_BYTES = 120_000     # JSON-encoded text bytes; stay under DeepL's 128 KiB body limit
+DEEPL_CONCURRENCY = 8         # requests in flight at once (one HTTP/2 connection)
+DEEPL_RATE = 10.0             # requests per second, shared by every caller
+DEEPL_BURST = 10              # requests allowed back to back before DEEPL_RATE applies
+
+# Optional fastText language-ID model (lid.176.ftz); without it nothing is skipped
+LID_MODEL_PATH = os.environ.get(
+    'TRANSLATOR_LID_MODEL', os.path.join(os.path.expanduser('~'), 'lid.176.ftz')
+)
+LID_MIN_PROB = 0.9            # confidence needed to skip a text as already translated
+LID_MIN_CHARS = 20            # shorter texts (names, labels) are detected unreliably
+LID_SAMPLE_SIZE = 20          # longest texts sampled to find a document's language
+LID_DOMINANT_SHARE = 0.8      # share of the sample one language needs to count as dominant
+
+# Short texts are packed into one item, separated by a symbol engines leave alone
+PACK_SENTINEL = '\u241E'
+PACK_JOINER = f'\n{PACK_SENTINEL}\n'
+PACK_MAX_ITEM_CHARS = 200     # longer texts are sent on their own
+PACK_MAX_CHARS = 4000         # size of one packed item
+
+
+def _retry_after(response, default: float) -> float:
+    """Seconds to wait from a 429 response's Retry-After header."""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default
+
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second, bursts of up to
+    `capacity`. A 429's Retry-After is fed to penalize(), which holds back
+    every caller (threads and coroutines alike) until it has passed.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()  # Refill time; in the future while penalized
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens (possibly on credit); returns seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= tokens
+            return max(0.0, self._updated - now) + max(0.0, -self._tokens) / self.rate
+    
+    def acquire(self, tokens: float = 1) -> None:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self, tokens: float = 1) -> None:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def penalize(self, seconds: float) -> None:
+        """Grant nothing for `seconds`, then refill from empty (no burst into the limit)."""
+        with self._lock:
+            self._updated = max(self._updated, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+# Runs of blanks; tabs and line breaks are left alone, as they must match exactly
+_SPACE_RUN_RE = re.compile(r'[^\S\t\n\r]+')
+
+
+def _normalize(text: str) -> str:
+    """Near-match cache key: outer whitespace stripped, inner runs of blanks collapsed."""
+    return _SPACE_RUN_RE.sub(' ', text.strip())
+
+
+def _replay_form(source: str, translation: str) -> str:
+    """A near-match's translation wrapped in the source's own surrounding whitespace."""
+    return source[:len(source) - len(source.lstrip())] + translation.strip() + source[len(source.rstrip()):]
+
 
 class Translator:
     """
     Fast translation engine with batching and caching.
     Primary: googletrans (fast, free)
     Fallback: DeepL API (reliable but slower)
+    Translations are also persisted to an on-disk SQLite cache so re-runs
+    of the same document skip the network entirely.
     """
     
-    def __init__(self, target_lang: str, deepl_api_key: Optional[str] = None, status_callback=None):
+    def __init__(self, target_lang: str, deepl_api_key: Optional[str] = None, status_callback=None,
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH):
         self.target_lang = LANGUAGE_CODES.get(target_lang.lower(), target_lang.lower())
         self.deepl_api_key = deepl_api_key
         self.status_callback = status_callback
-        self._cache: Dict[str, str] = {}
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        # Second tier, after the exact memory and disk lookups: normalized source -> translation
+        self._norm_cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._near_hits = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # Guards the SQLite connection and counters
+        self._init_disk_cache(cache_path)
         self._gtrans = None
         self._use_googletrans = True
+        self._tls = threading.local()  # One googletrans client per thread
+        self._gtrans_spare = None  # Startup-tested client, handed to the first thread needing one
+        self._executor: Optional[ThreadPoolExecutor] = None  # googletrans workers, created on first use
         self._init_googletrans()
         self._batch_queue: List[str] = []
         self._translation_count = 0
+        self._http = None  # Shared DeepL client, created on first use
+        self._async_http = None  # Async-path DeepL client, bound to the loop that created it
+        self._async_loop = None
+        self._limiter = _TokenBucket(DEEPL_RATE, DEEPL_BURST)  # Paces every DeepL request
+        self._lid = None
+        self._init_lid()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.aclose()
+    
+    async def aclose(self):
+        """close() for callers on an event loop: the async DeepL client is awaited shut first."""
+        if self._async_http is not None:
+            client, self._async_http = self._async_http, None
+            await client.aclose()
+        self.close()
+    
+    def close(self):
+        """Release the googletrans workers, the pooled HTTP connections and the cache database."""
+        if self._async_http is not None:
+            # Best effort outside aclose(): its connections belong to another loop
+            client, self._async_http = self._async_http, None
+            try:
+                asyncio.get_running_loop().create_task(client.aclose())
+            except RuntimeError:
+                try:
+                    asyncio.run(client.aclose())
+                except Exception as e:
+                    logger.debug(f"Async DeepL client not closed cleanly: {e}")
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
         
     def _update_status(self, msg):
         if self.status_callback:
@@ -52,6 +216,7 @@ class Translator:
         try:
             from googletrans import Translator as GTranslator
             self._gtrans = GTranslator()
+            self._gtrans_spare = self._gtrans
             # Test it
             test = self._gtrans.translate("hello", dest=self.target_lang)
             if test and test.text:
@@ -64,36 +229,198 @@ class Translator:
             self._use_googletrans = False
             self._gtrans = None
     
+    def _init_lid(self, model_path: str = LID_MODEL_PATH):
+        """Load the fastText language-ID model if fasttext and the model are available."""
+        if not os.path.exists(model_path):
+            return
+        try:
+            import fasttext
+            self._lid = fasttext.load_model(model_path)
+            logger.info("Language detection enabled")
+        except Exception as e:
+            logger.warning(f"Language detection unavailable: {e}")
+            self._lid = None
+    
+    def _detect(self, texts: List[str]) -> Optional[List[Optional[str]]]:
+        """
+        Language code of each text, or None where detection isn't confident.
+        Returns None if language detection is unavailable or fails.
+        """
+        if self._lid is None or not texts:
+            return None
+        try:
+            labels, probs = self._lid.predict([t.replace('\n', ' ') for t in texts], k=1)
+        except Exception as e:
+            logger.debug(f"Language detection failed: {e}")
+            return None
+        return [label[0].replace('__label__', '') if prob[0] >= LID_MIN_PROB else None
+                for label, prob in zip(labels, probs)]
+    
+    def _in_target_lang(self, texts: List[str]) -> List[bool]:
+        """Flag texts confidently detected as already in the target language."""
+        flags = [False] * len(texts)
+        idxs = [i for i, t in enumerate(texts) if len(t) >= LID_MIN_CHARS]
+        langs = self._detect([texts[i] for i in idxs])
+        if langs is None:
+            return flags
+        
+        for i, lang in zip(idxs, langs):
+            flags[i] = lang == self.target_lang
+        return flags
+    
+    def detect_dominant(self, texts: List[str]) -> Optional[str]:
+        """
+        Language of a whole document, judged from its LID_SAMPLE_SIZE longest
+        texts. None unless one language covers LID_DOMINANT_SHARE of the
+        sample, or if language detection is unavailable.
+        """
+        sample = heapq.nlargest(LID_SAMPLE_SIZE, (t for t in texts if len(t) >= LID_MIN_CHARS), key=len)
+        langs = self._detect(sample)
+        if not langs:
+            return None
+        lang, votes = Counter(langs).most_common(1)[0]
+        return lang if lang and votes >= LID_DOMINANT_SHARE * len(langs) else None
+    
+    def _cache_get(self, text: str) -> Optional[str]:
+        """In-memory cache lookup; a hit becomes most recently used."""
+        with self._lock:
+            result = self._cache.get(text)
+            if result is not None:
+                self._cache.move_to_end(text)
+            return result
+    
+    def _near_get(self, text: str) -> Optional[str]:
+        """
+        Near-match lookup, for texts that missed both exact caches: a cached
+        text differing only in outer whitespace or runs of spaces. Case,
+        tabs and line breaks must match exactly.
+        """
+        key = _normalize(text)
+        with self._lock:
+            translation = self._norm_cache.get(key)
+            if translation is None:
+                return None
+            self._norm_cache.move_to_end(key)
+            self._near_hits += 1
+        return _replay_form(text, translation)
+    
+    def _cache_put(self, text: str, translation: str):
+        """Add to the in-memory caches, evicting least recently used entries."""
+        key = _normalize(text)
+        with self._lock:
+            self._cache[text] = translation
+            self._cache.move_to_end(text)
+            while len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+            self._norm_cache[key] = translation
+            self._norm_cache.move_to_end(key)
+            while len(self._norm_cache) > CACHE_MAX_ENTRIES:
+                self._norm_cache.popitem(last=False)
+    
+    def _init_disk_cache(self, cache_path: Optional[str]):
+        """Open the persistent translation cache; disabled if unavailable."""
+        if not cache_path:
+            return
+        try:
+            # Shared by processor worker threads; access is serialised by self._lock
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            # WAL + NORMAL sync: cheap commits, and concurrent app instances can read
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS tr ('
+                'h BLOB NOT NULL, lang TEXT NOT NULL, txt TEXT NOT NULL, '
+                'PRIMARY KEY (h, lang))'
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache unavailable: {e}")
+            self._db = None
+    
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def _disk_lookup(self, texts: List[str]) -> Dict[str, str]:
+        """Return cached translations for the given texts (misses are omitted)."""
+        if self._db is None or not texts:
+            return {}
+        
+        by_hash = {self._hash(t): t for t in texts}
+        hashes = list(by_hash)
+        found = {}
+        try:
+            with self._lock:
+                # Stay well under SQLite's bound-parameter limit
+                for i in range(0, len(hashes), 500):
+                    chunk = hashes[i:i+500]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = self._db.execute(
+                        f'SELECT h, txt FROM tr WHERE lang = ? AND h IN ({placeholders})',
+                        [self.target_lang, *chunk]
+                    ).fetchall()
+                    for h, txt in rows:
+                        found[by_hash[h]] = txt
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache lookup failed: {e}")
+        return found
+    
+    def _disk_store(self, pairs: List[tuple]):
+        """Persist (source, translation) pairs; untranslated items are skipped."""
+        if self._db is None:
+            return
+        rows = [(self._hash(src), self.target_lang, trans)
+                for src, trans in pairs if trans and trans != src]
+        if not rows:
+            return
+        try:
+            with self._lock, self._db:
+                self._db.executemany('INSERT OR REPLACE INTO tr (h, lang, txt) VALUES (?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache write failed: {e}")
+    
     def translate(self, text: str, max_retries: int = 2) -> str:
         """Translate single text with caching."""
-        if not text or not text.strip():
-            return text
-        
-        stripped = text.strip()
-        if len(stripped) < 2:
-            return text
-        if stripped.replace(' ', '').replace('\n', '').replace('\t', '').isnumeric():
+        # One precompiled-regex pass: too short, numeric/symbols only, URL or email
+        if not needs_translation(text):
             return text
         
         # Check cache
         cache_key = text
-        if cache_key in self._cache:
-            return self._cache[cache_key]
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        cached = self._disk_lookup([text]).get(text)
+        if cached is not None:
+            self._cache_put(cache_key, cached)
+            return cached
+        cached = self._near_get(text)
+        if cached is not None:
+            return cached
+        
+        # Already in the target language
+        if self._in_target_lang([text])[0]:
+            self._cache_put(cache_key, text)
+            return text
         
         # Try googletrans first (much faster)
         if self._use_googletrans and self._gtrans:
             result = self._translate_googletrans(text, max_retries)
             if result and result != text:
-                self._cache[cache_key] = result
-                self._translation_count += 1
+                self._cache_put(cache_key, result)
+                self._disk_store([(text, result)])
+                with self._lock:
+                    self._translation_count += 1
                 return result
         
         # Fallback to DeepL
         if self.deepl_api_key:
             result = self._translate_deepl(text, max_retries)
             if result:
-                self._cache[cache_key] = result
-                self._translation_count += 1
+                self._cache_put(cache_key, result)
+                self._disk_store([(text, result)])
+                with self._lock:
+                    self._translation_count += 1
                 return result
         
         return text
@@ -106,101 +433,300 @@ class Translator:
         if not texts:
             return texts
         
+        results, to_translate = self._lookup_batch(texts)
+        if not to_translate:
+            return results
+        
+        # Each distinct text is sent once, however often it repeats
+        sources = list(dict.fromkeys(t for _, t in to_translate))
+        self._update_status(f"Translating {len(sources)} text blocks...")
+        
+        if self._use_googletrans and self._gtrans:
+            # Parallel translation with googletrans
+            translated = self._batch_packed(sources, self._batch_googletrans)
+        elif self.deepl_api_key:
+            # Batch translation with DeepL (concurrent requests)
+            translated = self._batch_packed(sources, self._batch_deepl)
+        else:
+            # No translator available, return originals
+            translated = None
+        
+        return self._store_batch(results, to_translate, sources, translated)
+    
+    async def translate_batch_async(self, texts: List[str]) -> List[str]:
+        """translate_batch for callers running inside an asyncio event loop."""
+        if not texts:
+            return texts
+        
+        results, to_translate = self._lookup_batch(texts)
+        if not to_translate:
+            return results
+        
+        # Each distinct text is sent once, however often it repeats
+        sources = list(dict.fromkeys(t for _, t in to_translate))
+        self._update_status(f"Translating {len(sources)} text blocks...")
+        
+        if self._use_googletrans and self._gtrans:
+            # googletrans is blocking; keep it off the event loop
+            translated = await asyncio.to_thread(self._batch_packed, sources, self._batch_googletrans)
+        elif self.deepl_api_key:
+            translated = await self._batch_packed_async(sources, self._batch_deepl_async)
+        else:
+            translated = None
+        
+        return self._store_batch(results, to_translate, sources, translated)
+    
+    def _lookup_batch(self, texts: List[str]) -> Tuple[List[str], List[Tuple[int, str]]]:
+        """
+        Fill results from the memory and disk caches. Returns the results
+        list and the (index, text) pairs that still need translating.
+        """
         results = [''] * len(texts)
         to_translate = []  # (index, text) pairs needing translation
         
         # Check cache first
         for i, text in enumerate(texts):
-            if not text or not text.strip() or len(text.strip()) < 2:
+            if not needs_translation(text):
                 results[i] = text
-            elif text in self._cache:
-                results[i] = self._cache[text]
+                continue
+            cached = self._cache_get(text)
+            if cached is not None:
+                results[i] = cached
             else:
                 to_translate.append((i, text))
         
-        if not to_translate:
-            return results
+        # Then the persistent cache, so only true misses hit the network
+        if to_translate:
+            disk_hits = self._disk_lookup([t for _, t in to_translate])
+            if disk_hits:
+                remaining = []
+                for idx, text in to_translate:
+                    if text in disk_hits:
+                        results[idx] = disk_hits[text]
+                        self._cache_put(text, disk_hits[text])
+                    else:
+                        remaining.append((idx, text))
+                to_translate = remaining
         
-        self._update_status(f"Translating {len(to_translate)} text blocks...")
+        # Near matches only once both exact caches have missed
+        if to_translate:
+            remaining = []
+            for idx, text in to_translate:
+                near = self._near_get(text)
+                if near is not None:
+                    results[idx] = near
+                else:
+                    remaining.append((idx, text))
+            to_translate = remaining
         
-        if self._use_googletrans and self._gtrans:
-            # Parallel translation with googletrans
-            translated = self._batch_googletrans([t[1] for t in to_translate])
-            for (idx, orig), trans in zip(to_translate, translated):
-                results[idx] = trans
-                self._cache[orig] = trans
-        elif self.deepl_api_key:
-            # Batch translation with DeepL (up to 50 at a time)
-            translated = self._batch_deepl([t[1] for t in to_translate])
-            for (idx, orig), trans in zip(to_translate, translated):
-                results[idx] = trans
-                self._cache[orig] = trans
-        else:
-            # No translator available, return originals
+        # Texts already in the target language are kept as they are
+        if to_translate and self._lid is not None:
+            remaining = []
+            flags = self._in_target_lang([t for _, t in to_translate])
+            for (idx, text), in_target in zip(to_translate, flags):
+                if in_target:
+                    results[idx] = text
+                    self._cache_put(text, text)
+                else:
+                    remaining.append((idx, text))
+            to_translate = remaining
+        
+        return results, to_translate
+    
+    def _store_batch(self, results: List[str], to_translate: List[Tuple[int, str]],
+                     sources: List[str], translated: Optional[List[str]]) -> List[str]:
+        """
+        Scatter the translations of the distinct sources back to every index
+        and into the caches (translated is None when no engine ran).
+        """
+        if translated is None:
             for idx, text in to_translate:
                 results[idx] = text
+        else:
+            text_to_trans = dict(zip(sources, translated))
+            for idx, orig in to_translate:
+                results[idx] = text_to_trans[orig]
+            for orig, trans in text_to_trans.items():
+                self._cache_put(orig, trans)
+            self._disk_store(list(text_to_trans.items()))
+        
+        with self._lock:
+            self._translation_count += len(sources)
+        return results
+    
+    @staticmethod
+    def _pack(texts: List[str]) -> Tuple[List[List[int]], List[str]]:
+        """
+        Pack short texts into sentinel-joined items so runs of labels/cells
+        travel as one item. Returns the index groups and the items to send.
+        """
+        groups: List[List[int]] = []
+        current: List[int] = []
+        size = 0
+        for i, text in enumerate(texts):
+            if len(text) > PACK_MAX_ITEM_CHARS or PACK_SENTINEL in text:
+                groups.append([i])
+                continue
+            if current and size + len(text) > PACK_MAX_CHARS:
+                groups.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += len(text) + len(PACK_JOINER)
+        if current:
+            groups.append(current)
+        
+        items = [PACK_JOINER.join(texts[i].strip() for i in group) if len(group) > 1 else texts[group[0]]
+                 for group in groups]
+        return groups, items
+    
+    @staticmethod
+    def _unpack(texts: List[str], groups: List[List[int]],
+                translated: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        Split translated items back per text. Returns the results and the
+        indices of packets that didn't split into the expected parts.
+        """
+        results = list(texts)
+        retry: List[int] = []
+        for group, trans in zip(groups, translated):
+            if len(group) == 1:
+                results[group[0]] = trans
+                continue
+            parts = trans.split(PACK_SENTINEL)
+            if len(parts) != len(group):
+                retry.extend(group)
+                continue
+            for i, part in zip(group, parts):
+                # Restore the source's surrounding whitespace (stripped for packing)
+                text = texts[i]
+                lead = text[:len(text) - len(text.lstrip())]
+                trail = text[len(text.rstrip()):]
+                results[i] = lead + part.strip() + trail
         
-        self._translation_count += len(to_translate)
+        if retry:
+            logger.debug(f"Packed translation lost separators, re-sending {len(retry)} items")
+        return results, retry
+    
+    def _batch_packed(self, texts: List[str], engine: Callable[[List[str]], List[str]]) -> List[str]:
+        """Translate texts with a batch engine, packing short ones together."""
+        groups, items = self._pack(texts)
+        results, retry = self._unpack(texts, groups, engine(items))
+        if retry:
+            for i, trans in zip(retry, engine([texts[i] for i in retry])):
+                results[i] = trans
         return results
     
+    async def _batch_packed_async(self, texts: List[str],
+                                  engine: Callable[[List[str]], Awaitable[List[str]]]) -> List[str]:
+        """Async variant of _batch_packed for coroutine engines."""
+        groups, items = self._pack(texts)
+        results, retry = self._unpack(texts, groups, await engine(items))
+        if retry:
+            for i, trans in zip(retry, await engine([texts[i] for i in retry])):
+                results[i] = trans
+        return results
+    
+    def _get_gtrans(self):
+        """
+        This thread's googletrans client. A client's internal HTTP session
+        isn't safe to share, so worker threads each get their own.
+        """
+        gtrans = getattr(self._tls, 'gtrans', None)
+        if gtrans is None:
+            with self._lock:
+                gtrans, self._gtrans_spare = self._gtrans_spare, None
+            if gtrans is None:
+                from googletrans import Translator as GTranslator
+                gtrans = GTranslator()
+            self._tls.gtrans = gtrans
+        return gtrans
+    
+    def _drop_gtrans(self):
+        """Discard this thread's client after a failure; the next call builds a fresh one."""
+        self._tls.gtrans = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Worker pool kept across batches, so each worker thread's googletrans
+        client (and its HTTP connection) is reused rather than rebuilt.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=GTRANS_WORKERS, thread_name_prefix='gtrans')
+            return self._executor
+    
     def _translate_googletrans(self, text: str, max_retries: int) -> Optional[str]:
         """Fast translation using googletrans."""
         for attempt in range(max_retries):
             try:
-                result = self._gtrans.translate(text, dest=self.target_lang)
+                result = self._get_gtrans().translate(text, dest=self.target_lang)
                 if result and result.text:
                     return result.text
             except Exception as e:
                 logger.debug(f"googletrans attempt {attempt+1} failed: {e}")
+                self._drop_gtrans()
                 if attempt < max_retries - 1:
                     time.sleep(0.5)
-                    # Reinitialize on failure
-                    try:
-                        from googletrans import Translator as GTranslator
-                        self._gtrans = GTranslator()
-                    except:
-                        pass
         return None
     
     def _batch_googletrans(self, texts: List[str]) -> List[str]:
         """Parallel batch translation with googletrans."""
-        results = [''] * len(texts)
+        if not texts:
+            return []
         
-        def translate_one(idx_text):
-            idx, text = idx_text
+        def translate_one(text):
             try:
-                result = self._gtrans.translate(text, dest=self.target_lang)
-                return idx, result.text if result and result.text else text
+                result = self._get_gtrans().translate(text, dest=self.target_lang)
+                return result.text if result and result.text else text
             except Exception as e:
-                logger.debug(f"Batch googletrans failed for item {idx}: {e}")
-                return idx, text
-        
-        # Use thread pool for parallel translation
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(translate_one, (i, t)) for i, t in enumerate(texts)]
-            for future in as_completed(futures):
-                try:
-                    idx, translated = future.result()
-                    results[idx] = translated
-                except Exception as e:
-                    logger.error(f"Future failed: {e}")
+                logger.debug(f"Batch googletrans failed: {e}")
+                self._drop_gtrans()
+                return text
         
-        return results
+        # I/O bound, so up to GTRANS_WORKERS requests at once; map keeps input order
+        return list(self._get_executor().map(translate_one, texts))
+    
+    def _deepl_headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'DeepL-Auth-Key {self.deepl_api_key}',
+            'Content-Type': 'application/json'
+        }
+    
+    def _get_http(self):
+        """One pooled HTTP/2 client, so single requests skip the TCP/TLS handshake."""
+        if self._http is None:
+            import httpx
+            self._http = httpx.Client(http2=True, timeout=60.0, headers=self._deepl_headers())
+        return self._http
+    
+    def _new_async_http(self):
+        import httpx
+        return httpx.AsyncClient(
+            headers=self._deepl_headers(),
+            timeout=60.0,
+            http2=True,
+            pool_limits=httpx.PoolLimits(max_keepalive=DEEPL_CONCURRENCY,
+                                         max_connections=DEEPL_CONCURRENCY)
+        )
+    
+    def _get_async_http(self):
+        """The async path's pooled client, kept across batches on the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._async_http is None or self._async_loop is not loop:
+            # A client from another loop can't be reused (or awaited closed) here
+            self._async_http = self._new_async_http()
+            self._async_loop = loop
+        return self._async_http
     
     def _translate_deepl(self, text: str, max_retries: int) -> Optional[str]:
         """Single text translation with DeepL."""
-        import httpx
-        
         deepl_lang = self.target_lang.upper()
         
         for attempt in range(max_retries):
             try:
-                response = httpx.post(
-                    'https://api-free.deepl.com/v2/translate',
-                    headers={
-                        'Authorization': f'DeepL-Auth-Key {self.deepl_api_key}',
-                        'Content-Type': 'application/json'
-                    },
+                self._limiter.acquire()
+                response = self._get_http().post(
+                    DEEPL_URL,
                     json={'text': [text], 'target_lang': deepl_lang},
                     timeout=30.0
                 )
@@ -210,7 +736,8 @@ class Translator:
                     if data.get('translations'):
                         return data['translations'][0]['text']
                 elif response.status_code == 429:
-                    time.sleep(2)
+                    # The next acquire() waits as long as DeepL asks
+                    self._limiter.penalize(_retry_after(response, 2))
                     
             except Exception as e:
                 logger.debug(f"DeepL attempt {attempt+1} failed: {e}")
@@ -219,52 +746,96 @@ class Translator:
         
         return None
     
-    def _batch_deepl(self, texts: List[str], batch_size: int = 50) -> List[str]:
-        """Batch translation with DeepL API (up to 50 texts per request)."""
-        import httpx
+    @staticmethod
+    def _deepl_chunks(texts: List[str]) -> List[List[int]]:
+        """
+        Group text indices into DeepL requests (item count and payload caps).
+        First-fit decreasing: longest texts are placed first, each into the
+        first request with room, so few requests go out half empty.
+        """
+        # Bytes each text adds to the request body as httpx serialises it
+        # (json.dumps escapes non-ASCII as \uXXXX), plus its ", " separator
+        sizes = [len(json.dumps(t)) + 2 for t in texts]
+        order = sorted(range(len(texts)), key=lambda i: -sizes[i])
+        
+        chunks: List[List[int]] = []
+        chunk_bytes: List[int] = []
+        for i in order:
+            n = sizes[i]
+            for c, chunk in enumerate(chunks):
+                if len(chunk) < DEEPL_MAX_ITEMS and chunk_bytes[c] + n <= DEEPL_MAX_BYTES:
+                    chunk.append(i)
+                    chunk_bytes[c] += n
+                    break
+            else:
+                chunks.append([i])
+                chunk_bytes.append(n)
+        return chunks
+    
+    def _batch_deepl(self, texts: List[str]) -> List[str]:
+        """Batch translation with DeepL API, request chunks sent concurrently."""
+        return asyncio.run(self._batch_deepl_once(texts))
+    
+    async def _batch_deepl_once(self, texts: List[str]) -> List[str]:
+        # asyncio.run gives each sync call its own loop, so the client is per call too
+        async with self._new_async_http() as client:
+            return await self._batch_deepl_async(texts, client)
+    
+    async def _batch_deepl_async(self, texts: List[str], client=None) -> List[str]:
+        results = list(texts)  # Originals are kept for any failed chunk
+        chunks = self._deepl_chunks(texts)
+        sem = asyncio.Semaphore(DEEPL_CONCURRENCY)
+        if client is None:
+            client = self._get_async_http()
+        
+        translated = await asyncio.gather(*[
+            self._translate_chunk(client, sem, [texts[i] for i in chunk])
+            for chunk in chunks
+        ])
         
-        results = []
+        for chunk, chunk_results in zip(chunks, translated):
+            for i, text in zip(chunk, chunk_results):
+                results[i] = text
+        return results
+    
+    async def _translate_chunk(self, client, sem, batch: List[str], max_retries: int = 3) -> List[str]:
+        """One DeepL request for up to DEEPL_MAX_ITEMS texts."""
         deepl_lang = self.target_lang.upper()
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            
-            try:
-                response = httpx.post(
-                    'https://api-free.deepl.com/v2/translate',
-                    headers={
-                        'Authorization': f'DeepL-Auth-Key {self.deepl_api_key}',
-                        'Content-Type': 'application/json'
-                    },
-                    json={'text': batch, 'target_lang': deepl_lang},
-                    timeout=60.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    translations = data.get('translations', [])
-                    for j, item in enumerate(translations):
-                        results.append(item.get('text', batch[j]))
-                    # Fill any missing
-                    while len(results) < i + len(batch):
-                        results.append(batch[len(results) - i])
-                else:
+        async with sem:
+            for attempt in range(max_retries):
+                try:
+                    await self._limiter.acquire_async()
+                    response = await client.post(
+                        DEEPL_URL,
+                        json={'text': batch, 'target_lang': deepl_lang}
+                    )
+                    
+                    if response.status_code == 200:
+                        translations = response.json().get('translations', [])
+                        results = [item.get('text', orig) for item, orig in zip(translations, batch)]
+                        # Fill any missing
+                        results.extend(batch[len(results):])
+                        return results
+                    elif response.status_code == 429:
+                        # Rate limited: every request waits as long as DeepL asks
+                        self._limiter.penalize(_retry_after(response, 2 ** attempt))
+                        continue
+                    
                     logger.warning(f"DeepL batch failed: {response.status_code}")
-                    results.extend(batch)  # Keep originals
+                    break
                     
-            except Exception as e:
-                logger.error(f"DeepL batch error: {e}")
-                results.extend(batch)  # Keep originals
-            
-            # Small delay between batches to avoid rate limiting
-            if i + batch_size < len(texts):
-                time.sleep(0.5)
+                except Exception as e:
+                    logger.error(f"DeepL batch error: {e}")
+                    if attempt < max_retries - 1:
+                        await asyncio.sleep(1)
         
-        return results
+        return batch  # Keep originals
     
     def get_stats(self) -> dict:
         return {
             'cached_translations': len(self._cache),
+            'near_cache_hits': self._near_hits,
             'total_translated': self._translation_count,
             'target_language': self.target_lang,
             'engine': 'googletrans' if self._use_googletrans else 'deepl'